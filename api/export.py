@@ -0,0 +1,247 @@
+import os
+import json
+import uuid
+import zlib
+import itertools
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Iterator
+
+# Optional codecs: zstd needs `pip install zstandard`, Parquet needs `pip install pyarrow`
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", "1000"))
+
+HISTORY_COLUMNS = (
+    "id",
+    "user_id",
+    "template_type",
+    "form_data",
+    "context_file_path",
+    "context_filename",
+    "generated_content",
+    "created_at",
+)
+# Needed for keyset pagination, fetched even when not exported
+_CURSOR_COLUMNS = ("created_at", "id")
+
+
+class ExportError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def parse_columns(columns: Optional[str]) -> List[str]:
+    if not columns:
+        return list(HISTORY_COLUMNS)
+    selected = list(dict.fromkeys(c.strip() for c in columns.split(",") if c.strip()))
+    unknown = [c for c in selected if c not in HISTORY_COLUMNS]
+    if unknown:
+        raise ExportError(400, f"Unknown columns: {', '.join(unknown)}")
+    return selected
+
+
+def _parse_datetime(value: str) -> datetime:
+    # fromisoformat only accepts a trailing "Z" from Python 3.11 on
+    parsed = datetime.fromisoformat(value[:-1] + "+00:00" if value.endswith("Z") else value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def parse_timestamp(value: Optional[str], name: str, end_of_day: bool = False) -> Optional[str]:
+    """
+    Normalize an ISO 8601 date or timestamp (naive values are UTC) for PostgREST.
+    With end_of_day, a bare date means the start of the next day, so an
+    exclusive upper bound still covers the whole given day.
+    """
+    if not value:
+        return None
+    try:
+        parsed = _parse_datetime(value)
+    except ValueError:
+        raise ExportError(400, f"{name} must be an ISO 8601 date or timestamp")
+    if end_of_day:
+        try:
+            date.fromisoformat(value)
+            parsed += timedelta(days=1)
+        except ValueError:
+            pass
+    return parsed.isoformat()
+
+
+def parse_user_id(value: Optional[str]) -> Optional[str]:
+    if not value:
+        return None
+    try:
+        return str(uuid.UUID(value))
+    except ValueError:
+        raise ExportError(400, "user_id must be a UUID")
+
+
+def prefetch_first_chunk(chunks: Iterator[List[Dict[str, Any]]]) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Run the first query now, so a failing export surfaces as an error status
+    instead of a 200 with an empty file. Returns an iterator over all chunks.
+    """
+    first = next(chunks, None)
+    return itertools.chain([] if first is None else [first], chunks)
+
+
+def check_format(fmt: str, compression: str):
+    if fmt not in ("ndjson", "parquet"):
+        raise ExportError(400, "format must be ndjson or parquet")
+    if fmt == "parquet":
+        if pq is None:
+            raise ExportError(501, "Parquet export requires pyarrow")
+        if compression not in ("none", "zstd", "gzip", "snappy"):
+            raise ExportError(400, "Parquet compression must be none, zstd, gzip or snappy")
+    else:
+        if compression not in ("none", "gzip", "zstd"):
+            raise ExportError(400, "NDJSON compression must be none, gzip or zstd")
+        if compression == "zstd" and zstandard is None:
+            raise ExportError(501, "zstd compression requires zstandard")
+
+
+def iter_history_rows(
+    client,
+    columns: List[str],
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    user_id: Optional[str] = None,
+    template_type: Optional[str] = None,
+    chunk_rows: int = EXPORT_CHUNK_ROWS,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Yield generation_history rows in chunks, oldest first. Uses keyset
+    pagination on (created_at, id) so each page is an index range scan
+    instead of an ever-growing OFFSET.
+    """
+    fetch_columns = list(dict.fromkeys([*columns, *_CURSOR_COLUMNS]))
+    cursor = None
+    while True:
+        query = client.table("generation_history").select(",".join(fetch_columns))
+        if start:
+            query = query.gte("created_at", start)
+        if end:
+            query = query.lt("created_at", end)
+        if user_id:
+            query = query.eq("user_id", user_id)
+        if template_type:
+            query = query.eq("template_type", template_type)
+        if cursor:
+            ts, row_id = cursor
+            query = query.or_(f'created_at.gt."{ts}",and(created_at.eq."{ts}",id.gt.{row_id})')
+        res = query.order("created_at").order("id").limit(chunk_rows).execute()
+        rows = res.data or []
+        if not rows:
+            return
+        cursor = (rows[-1]["created_at"], rows[-1]["id"])
+        yield [{c: row.get(c) for c in columns} for row in rows]
+        if len(rows) < chunk_rows:
+            return
+
+
+def _ndjson_lines(chunk: List[Dict[str, Any]]) -> bytes:
+    return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in chunk).encode("utf-8")
+
+
+def stream_ndjson(chunks: Iterator[List[Dict[str, Any]]], compression: str = "gzip") -> Iterator[bytes]:
+    if compression == "gzip":
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip container
+        for chunk in chunks:
+            data = compressor.compress(_ndjson_lines(chunk))
+            if data:
+                yield data
+        yield compressor.flush()
+    elif compression == "zstd":
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+        for chunk in chunks:
+            data = compressor.compress(_ndjson_lines(chunk))
+            if data:
+                yield data
+        yield compressor.flush()
+    else:
+        for chunk in chunks:
+            yield _ndjson_lines(chunk)
+
+
+class _DrainableSink:
+    """
+    Write-only file object whose buffered bytes can be taken after each row group.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _parquet_value(column: str, value: Any) -> Any:
+    if value is None:
+        return None
+    if column == "created_at":
+        return _parse_datetime(value) if isinstance(value, str) else value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def stream_parquet(chunks: Iterator[List[Dict[str, Any]]], columns: List[str], compression: str = "zstd") -> Iterator[bytes]:
+    # created_at is a real UTC timestamp; everything else is a string (form_data as JSON)
+    # so all row groups share one schema
+    schema = pa.schema([
+        (c, pa.timestamp("us", tz="UTC") if c == "created_at" else pa.string()) for c in columns
+    ])
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema, compression=None if compression == "none" else compression)
+    try:
+        for chunk in chunks:
+            arrays = [
+                pa.array([_parquet_value(c, row[c]) for row in chunk], type=schema.field(c).type)
+                for c in columns
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
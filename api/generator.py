@@ -1,7 +1,8 @@
 import os
 import json
+import asyncio
 import httpx
-from typing import Dict, Any, AsyncGenerator
+from typing import Dict, Any, AsyncGenerator, List, Optional
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
@@ -18,6 +19,10 @@ load_dotenv(_env_path)
 DEEPSEEK_API_KEY = os.environ.get("DEEPSEEK_API_KEY")
 DEEPSEEK_API_URL = "https://api.deepseek.com/chat/completions"
 
+# Batch generation limits
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "10"))
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", "4"))
+
 SUPABASE_URL = os.environ.get("NEXT_PUBLIC_SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("NEXT_PUBLIC_SUPABASE_ANON_KEY")
 SERVICE_ROLE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
@@ -37,8 +42,16 @@ def get_template_from_db(template_key: str):
         print(f"Error fetching template {template_key}: {e}")
         return None
 
-def build_prompt(template_type: str, form_data: Dict[str, Any], context_text: str = "") -> str:
-    template_config = get_template_from_db(template_type)
+def build_prompt(
+    template_type: str,
+    form_data: Dict[str, Any],
+    context_text: str = "",
+    template_config: Optional[Dict[str, Any]] = None,
+) -> str:
+    # Callers that already hold the template row (e.g. batch generation) pass it in
+    # to skip the lookup.
+    if template_config is None:
+        template_config = get_template_from_db(template_type)
     
     if not template_config:
         # Fallback if DB fetch fails or template not found
@@ -71,12 +84,32 @@ def build_prompt(template_type: str, form_data: Dict[str, Any], context_text: st
     
     return formatted_prompt
 
+SYSTEM_PROMPT = "You are a helpful assistant specialized in writing corporate publicity articles."
+
+# stream_chat reports failures in-band as text chunks starting with one of these
+MISSING_API_KEY_ERROR = "Error: DEEPSEEK_API_KEY not configured."
+UPSTREAM_ERROR_PREFIXES = (MISSING_API_KEY_ERROR, "\n[API Error", "\n[Network Error")
+
+def is_upstream_error(chunk: str) -> bool:
+    return chunk.startswith(UPSTREAM_ERROR_PREFIXES)
+
 async def stream_generate(prompt: str) -> AsyncGenerator[str, None]:
     """
     Call Deepseek API with streaming enabled.
     """
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+    async for chunk in stream_chat(messages):
+        yield chunk
+
+async def stream_chat(messages: List[Dict[str, str]]) -> AsyncGenerator[str, None]:
+    """
+    Stream a chat completion for a prepared message list.
+    """
     if not DEEPSEEK_API_KEY:
-        yield "Error: DEEPSEEK_API_KEY not configured."
+        yield MISSING_API_KEY_ERROR
         return
 
     headers = {
@@ -86,10 +119,7 @@ async def stream_generate(prompt: str) -> AsyncGenerator[str, None]:
     
     payload = {
         "model": "deepseek-chat", # Or deepseek-reasoner depending on preference
-        "messages": [
-            {"role": "system", "content": "You are a helpful assistant specialized in writing corporate publicity articles."},
-            {"role": "user", "content": prompt}
-        ],
+        "messages": messages,
         "stream": True
     }
 
@@ -114,6 +144,63 @@ async def stream_generate(prompt: str) -> AsyncGenerator[str, None]:
         except Exception as e:
             yield f"\n[Network Error: {str(e)}]"
 
+async def get_templates_for_batch(template_keys: List[str]) -> Dict[str, Any]:
+    """
+    Fetch each distinct template once, concurrently, for a batch of requests.
+    """
+    keys = list(dict.fromkeys(template_keys))
+    rows = await asyncio.gather(*(asyncio.to_thread(get_template_from_db, key) for key in keys))
+    return dict(zip(keys, rows))
+
+def _batch_event(index: int, event: str, **fields) -> str:
+    return f"data: {json.dumps({'index': index, 'event': event, **fields}, ensure_ascii=False)}\n\n"
+
+async def stream_generate_batch(prompts: List[str], max_concurrency: int = BATCH_MAX_CONCURRENCY) -> AsyncGenerator[str, None]:
+    """
+    Run several generations concurrently (bounded by max_concurrency) and
+    multiplex them into one SSE stream. Each event is a JSON object tagged with
+    the item index: status changes ("queued", "running", "done", "error") and
+    "chunk" events carrying content.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run_item(index: int, prompt: str):
+        try:
+            async with semaphore:
+                await queue.put(_batch_event(index, "running"))
+                async for chunk in stream_generate(prompt):
+                    if is_upstream_error(chunk):
+                        await queue.put(_batch_event(index, "error", message=chunk.strip()))
+                        return
+                    await queue.put(_batch_event(index, "chunk", content=chunk))
+            await queue.put(_batch_event(index, "done"))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await queue.put(_batch_event(index, "error", message=str(e)))
+        finally:
+            await queue.put(None)
+
+    for index in range(len(prompts)):
+        yield _batch_event(index, "queued")
+
+    tasks = [asyncio.create_task(run_item(i, p)) for i, p in enumerate(prompts)]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            item = await queue.get()
+            if item is None:
+                remaining -= 1
+                continue
+            yield item
+        yield "data: [DONE]\n\n"
+    finally:
+        # Client disconnected or stream finished: make sure no upstream call is left running
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
 async def rewrite_text(text: str, command: str, context_before: str = "", context_after: str = "") -> AsyncGenerator[str, None]:
     """
     Rewrite specific text based on command (expand, shorten, rephrase).
@@ -1,12 +1,16 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Depends, status
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Depends, status, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
 from datetime import datetime, timedelta
 import jwt
 import hashlib
+import json
 import os
+import threading
+import time
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
@@ -16,10 +20,36 @@ load_dotenv(_env_path)
 # Import internal modules
 try:
     from api.parser import extract_text_from_file
-    from api.generator import build_prompt, stream_generate, rewrite_text
+    from api.generator import (
+        build_prompt, stream_generate, rewrite_text,
+        get_templates_for_batch, stream_generate_batch, BATCH_MAX_ITEMS,
+    )
+    from api.jobs import get_job_store, submit_job, tail_job
+    from api.ratelimit import create_rate_limit_store
+    from api.export import (
+        ExportError, parse_columns, parse_timestamp, parse_user_id, check_format,
+        iter_history_rows, prefetch_first_chunk, stream_ndjson, stream_parquet,
+    )
+    from api.rewrite_session import (
+        rewrite_sessions, RewriteSessionError, prepare_session_rewrite, stream_session_rewrite,
+        apply_ops, check_document, check_version, check_ops,
+    )
 except ImportError:
     from parser import extract_text_from_file
-    from generator import build_prompt, stream_generate, rewrite_text
+    from generator import (
+        build_prompt, stream_generate, rewrite_text,
+        get_templates_for_batch, stream_generate_batch, BATCH_MAX_ITEMS,
+    )
+    from jobs import get_job_store, submit_job, tail_job
+    from ratelimit import create_rate_limit_store
+    from export import (
+        ExportError, parse_columns, parse_timestamp, parse_user_id, check_format,
+        iter_history_rows, prefetch_first_chunk, stream_ndjson, stream_parquet,
+    )
+    from rewrite_session import (
+        rewrite_sessions, RewriteSessionError, prepare_session_rewrite, stream_session_rewrite,
+        apply_ops, check_document, check_version, check_ops,
+    )
 
 app = FastAPI()
 
@@ -36,11 +66,26 @@ SUPABASE_URL = os.environ.get("NEXT_PUBLIC_SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("NEXT_PUBLIC_SUPABASE_ANON_KEY")
 SERVICE_ROLE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY") # Needed for admin ops
 
+# Public template catalog: served from memory, fresh for TTL, then served stale while revalidating
+TEMPLATE_CATALOG_TTL_SECONDS = int(os.environ.get("TEMPLATE_CATALOG_TTL_SECONDS", "60"))
+TEMPLATE_CATALOG_STALE_SECONDS = int(os.environ.get("TEMPLATE_CATALOG_STALE_SECONDS", "600"))
+
+# User admission for generation endpoints
+SUPABASE_JWT_SECRET = os.environ.get("SUPABASE_JWT_SECRET") # Verifies user tokens locally when set
+USER_TOKEN_CACHE_SECONDS = int(os.environ.get("USER_TOKEN_CACHE_SECONDS", "60"))
+CREDIT_CACHE_TTL_SECONDS = int(os.environ.get("CREDIT_CACHE_TTL_SECONDS", "30"))
+RATE_LIMIT_WINDOW_SECONDS = int(os.environ.get("RATE_LIMIT_WINDOW_SECONDS", "60"))
+GENERATE_RATE_LIMIT = int(os.environ.get("GENERATE_RATE_LIMIT", "10"))
+REWRITE_RATE_LIMIT = int(os.environ.get("REWRITE_RATE_LIMIT", "30"))
+
 # Initialize Supabase Client
 admin_sb: Optional[Client] = None
 if SUPABASE_URL and (SERVICE_ROLE_KEY or SUPABASE_KEY):
     admin_sb = create_client(SUPABASE_URL, SERVICE_ROLE_KEY or SUPABASE_KEY)
 
+# Lazily created anon client, only used when admin_sb is unavailable
+public_sb: Optional[Client] = None
+
 # Auth Models
 class Token(BaseModel):
     access_token: str
@@ -65,12 +110,37 @@ class GenerateRequest(BaseModel):
     form_data: Dict[str, Any]
     context_text: Optional[str] = ""
 
+class BatchGenerateRequest(BaseModel):
+    # Shared reference material; an item's own context_text takes precedence if set
+    context_text: Optional[str] = ""
+    items: List[GenerateRequest]
+
 class RewriteRequest(BaseModel):
     text: str
     command: str
     context_before: Optional[str] = ""
     context_after: Optional[str] = ""
 
+class RewriteSessionCreate(BaseModel):
+    document: str
+
+class TextEdit(BaseModel):
+    start: int
+    end: int
+    text: str
+
+class RewriteSessionUpdate(BaseModel):
+    # Either replace the whole document or apply edits (offsets into the current version)
+    document: Optional[str] = None
+    ops: List[TextEdit] = []
+    version: Optional[int] = None
+
+class SessionRewriteRequest(BaseModel):
+    start: int
+    end: int
+    command: str
+    version: Optional[int] = None
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -139,6 +209,115 @@ async def get_current_admin(request: Request):
         raise credentials_exception
     return username
 
+# --- User Admission ---
+
+rate_limits = create_rate_limit_store()
+_user_token_cache: Dict[str, Any] = {}  # token hash -> (user_id, expires_at)
+_profile_cache: Dict[str, Any] = {}  # user_id -> {"credits", "status", "fetched_at"}
+_profile_cache_lock = threading.Lock()
+
+def _verify_user_token(token: str) -> str:
+    if SUPABASE_JWT_SECRET:
+        payload = jwt.decode(token, SUPABASE_JWT_SECRET, algorithms=["HS256"], audience="authenticated")
+        user_id = payload.get("sub")
+        if not user_id:
+            raise jwt.InvalidTokenError("Token has no subject")
+        return user_id
+
+    # Without the JWT secret, ask Supabase Auth and remember the answer briefly
+    if not admin_sb:
+        raise HTTPException(status_code=500, detail="User auth not configured: set SUPABASE_JWT_SECRET")
+    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    cached = _user_token_cache.get(token_hash)
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+    try:
+        resp = admin_sb.auth.get_user(token)
+    except Exception as e:
+        raise jwt.InvalidTokenError(str(e))
+    user = getattr(resp, "user", None)
+    if not user:
+        raise jwt.InvalidTokenError("Unknown user")
+    if len(_user_token_cache) > 10000:
+        _user_token_cache.clear()
+    _user_token_cache[token_hash] = (user.id, time.monotonic() + USER_TOKEN_CACHE_SECONDS)
+    return user.id
+
+async def get_current_user(request: Request) -> str:
+    auth = request.headers.get("Authorization", "")
+    if not auth.startswith("Bearer "):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Please log in first",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    try:
+        return _verify_user_token(auth.replace("Bearer ", "", 1).strip())
+    except jwt.PyJWTError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+def _get_user_profile(user_id: str) -> Dict[str, Any]:
+    now = time.monotonic()
+    with _profile_cache_lock:
+        cached = _profile_cache.get(user_id)
+        if cached and now - cached["fetched_at"] < CREDIT_CACHE_TTL_SECONDS:
+            return cached
+    if not admin_sb:
+        raise HTTPException(status_code=500, detail="Supabase client init failed")
+    try:
+        res = admin_sb.table("profiles").select("credits,status").eq("id", user_id).limit(1).execute()
+    except Exception as e:
+        print(f"Profile lookup failed for {user_id}: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Profile service unavailable, please retry")
+    if not res.data:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User profile not found")
+    data = res.data[0]
+    profile = {"credits": data.get("credits") or 0, "status": data.get("status") or "active", "fetched_at": now}
+    with _profile_cache_lock:
+        _profile_cache[user_id] = profile
+    return profile
+
+def invalidate_user_profile(user_id: str):
+    with _profile_cache_lock:
+        _profile_cache.pop(user_id, None)
+
+def reserve_credits(user_id: str, amount: int):
+    # Credits are deducted in the browser after completion; counting admitted
+    # generations against the cached balance stops a user from opening more
+    # streams than they can pay for while the cache entry is alive.
+    profile = _get_user_profile(user_id)
+    with _profile_cache_lock:
+        if profile["credits"] < amount:
+            raise HTTPException(status_code=status.HTTP_402_PAYMENT_REQUIRED, detail=f"Insufficient credits: {amount} required")
+        profile["credits"] -= amount
+
+def _admit(user_id: str, kind: str, limit: int, min_credits: int, cost: int = 1) -> str:
+    # cost is the number of articles (or rewrites) the request will produce
+    allowed, retry_after = rate_limits.hit(f"{kind}:{user_id}", limit, RATE_LIMIT_WINDOW_SECONDS, cost)
+    if not allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests, please try again later",
+            headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+        )
+    profile = _get_user_profile(user_id)
+    if profile["status"] != "active":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Account is frozen")
+    if profile["credits"] < min_credits:
+        raise HTTPException(status_code=status.HTTP_402_PAYMENT_REQUIRED, detail="Insufficient credits")
+    return user_id
+
+async def admit_generation(user_id: str = Depends(get_current_user)) -> str:
+    return _admit(user_id, "generate", GENERATE_RATE_LIMIT, 1)
+
+async def admit_rewrite(user_id: str = Depends(get_current_user)) -> str:
+    # Rewrites are free, so only auth, status and rate limits apply
+    return _admit(user_id, "rewrite", REWRITE_RATE_LIMIT, 0)
+
 async def log_admin_action(admin_username: str, action: str, details: dict = None, target_user_id: str = None):
     try:
         if not admin_sb:
@@ -221,6 +400,7 @@ async def update_user_credits(
     res = admin_sb.table("profiles").update({"credits": credit_data.credits}).eq("id", user_id).execute()
     if not res.data:
         raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user_profile(user_id)
     
     await log_admin_action(admin, "update_credits", {"new_credits": credit_data.credits}, user_id)
     return res.data[0]
@@ -235,6 +415,7 @@ async def update_user_status(
     res = admin_sb.table("profiles").update({"status": status_data.status}).eq("id", user_id).execute()
     if not res.data:
         raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user_profile(user_id)
     
     await log_admin_action(admin, "update_status", {"new_status": status_data.status}, user_id)
     return res.data[0]
@@ -261,6 +442,59 @@ async def get_all_history(
     
     return {"data": res.data, "count": res.count}
 
+@app.get("/api/admin/history/export")
+async def export_history(
+    format: str = "ndjson",
+    compression: Optional[str] = None,
+    columns: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    user_id: Optional[str] = None,
+    template_type: Optional[str] = None,
+    admin: str = Depends(get_current_admin)
+):
+    ensure_admin_configured()
+    compression = compression or ("zstd" if format == "parquet" else "gzip")
+    try:
+        check_format(format, compression)
+        selected = parse_columns(columns)
+        start = parse_timestamp(start, "start")
+        end = parse_timestamp(end, "end", end_of_day=True)
+        user_id = parse_user_id(user_id)
+    except ExportError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    # Rows are pulled from Supabase chunk by chunk while the response streams,
+    # so memory stays flat regardless of how many rows match. The first chunk is
+    # fetched before responding; a later failure aborts the transfer mid-body
+    # rather than ending it cleanly, so clients see an incomplete download.
+    chunks = iter_history_rows(admin_sb, selected, start, end, user_id, template_type)
+    try:
+        chunks = await run_in_threadpool(prefetch_first_chunk, chunks)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"History query failed: {e}")
+
+    await log_admin_action(admin, "export_history", {
+        "format": format, "compression": compression, "columns": selected,
+        "start": start, "end": end, "user_id": user_id, "template_type": template_type,
+    })
+    if format == "parquet":
+        body = stream_parquet(chunks, selected, compression)
+        media_type, filename = "application/vnd.apache.parquet", "history.parquet"
+    else:
+        body = stream_ndjson(chunks, compression)
+        media_type, filename = {
+            "gzip": ("application/gzip", "history.ndjson.gz"),
+            "zstd": ("application/zstd", "history.ndjson.zst"),
+            "none": ("application/x-ndjson", "history.ndjson"),
+        }[compression]
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
 @app.get("/api/admin/audit")
 async def get_audit_logs(
     page: int = 0, 
@@ -431,6 +665,7 @@ async def create_template(template: Template, admin: str = Depends(get_current_a
     if getattr(res, "error", None):
         raise HTTPException(status_code=500, detail=f"Failed to create template: {res.error}")
     
+    refresh_template_catalog()
     await log_admin_action(admin, "create_template", {"key": template.key, "name": template.name})
     return res.data[0]
 
@@ -446,6 +681,7 @@ async def update_template(template_id: str, template: Template, admin: str = Dep
     if not res.data:
         raise HTTPException(status_code=404, detail="Template not found")
         
+    refresh_template_catalog()
     await log_admin_action(admin, "update_template", {"id": template_id, "name": template.name})
     return res.data[0]
 
@@ -456,27 +692,102 @@ async def delete_template(template_id: str, admin: str = Depends(get_current_adm
     if not res.data:
         raise HTTPException(status_code=404, detail="Template not found")
         
+    refresh_template_catalog()
     await log_admin_action(admin, "delete_template", {"id": template_id})
     return {"success": True}
 
+# --- Public Template Catalog ---
+
+_template_catalog: Dict[str, Any] = {"body": None, "etag": None, "built_at": 0.0}
+_template_catalog_lock = threading.Lock()
+_template_catalog_refreshing = False
+
+def _get_catalog_client() -> Optional[Client]:
+    # Use the initialized client (could be service role or anon depending on config).
+    # RLS policy "Templates are viewable by everyone" allows the anon key to select.
+    global public_sb
+    if admin_sb:
+        return admin_sb
+    if public_sb is None and SUPABASE_URL and SUPABASE_KEY:
+        public_sb = create_client(SUPABASE_URL, SUPABASE_KEY)
+    return public_sb
+
+def rebuild_template_catalog() -> Dict[str, Any]:
+    """
+    Query active templates and swap in a new serialized snapshot with a strong ETag.
+    """
+    global _template_catalog
+    client = _get_catalog_client()
+    data = []
+    if client:
+        res = client.table("templates").select("key,name,description,form_config").eq("status", "active").order("created_at", desc=False).execute()
+        data = res.data or []
+
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    snapshot = {
+        "body": body,
+        "etag": f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+        "built_at": time.monotonic(),
+    }
+    _template_catalog = snapshot
+    return snapshot
+
+def refresh_template_catalog():
+    # Called after admin template writes; on failure, mark the snapshot expired
+    # so the next public request rebuilds it synchronously.
+    global _template_catalog
+    try:
+        with _template_catalog_lock:
+            rebuild_template_catalog()
+    except Exception as e:
+        print(f"Failed to rebuild template catalog: {e}")
+        _template_catalog = {**_template_catalog, "built_at": 0.0}
+
+def _revalidate_template_catalog():
+    global _template_catalog_refreshing
+    try:
+        refresh_template_catalog()
+    finally:
+        _template_catalog_refreshing = False
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [t.strip() for t in if_none_match.split(",")]
+    return any(t[2:] == etag if t.startswith("W/") else t == etag for t in candidates)
+
 @app.get("/api/templates")
-async def get_public_templates():
-    # Public endpoint for frontend to fetch active templates
-    # If no Supabase client configured (unlikely in prod), return empty list or fallback?
-    # We should have admin_sb initialized if env vars are present. 
-    # If using anon key, we need to ensure RLS allows select.
-    # Our init script: "create policy "Templates are viewable by everyone" on public.templates for select using (true);"
-    
-    client = admin_sb # Use the initialized client (could be service role or anon depending on config)
-    if not client:
-        # Try to init a public client if admin_sb failed (e.g. missing service key but has anon key)
-        if SUPABASE_URL and SUPABASE_KEY:
-            client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        else:
-            return []
-            
-    res = client.table("templates").select("key,name,description,form_config").eq("status", "active").order("created_at", desc=False).execute()
-    return res.data
+async def get_public_templates(request: Request, background_tasks: BackgroundTasks):
+    # Public endpoint for frontend to fetch active templates.
+    # Served from an in-memory snapshot: fresh within TTL, served stale (with a
+    # background rebuild) within the stale window, rebuilt inline beyond that.
+    global _template_catalog_refreshing
+    snapshot = _template_catalog
+    age = time.monotonic() - snapshot["built_at"]
+
+    if snapshot["body"] is None or age > TEMPLATE_CATALOG_TTL_SECONDS + TEMPLATE_CATALOG_STALE_SECONDS:
+        try:
+            with _template_catalog_lock:
+                snapshot = _template_catalog
+                if snapshot["body"] is None or time.monotonic() - snapshot["built_at"] > TEMPLATE_CATALOG_TTL_SECONDS:
+                    snapshot = rebuild_template_catalog()
+        except Exception as e:
+            if snapshot["body"] is None:
+                raise HTTPException(status_code=500, detail=f"Failed to load templates: {e}")
+            print(f"Template catalog rebuild failed, serving stale snapshot: {e}")
+    elif age > TEMPLATE_CATALOG_TTL_SECONDS and not _template_catalog_refreshing:
+        _template_catalog_refreshing = True
+        background_tasks.add_task(_revalidate_template_catalog)
+
+    headers = {
+        "ETag": snapshot["etag"],
+        "Cache-Control": f"public, max-age=0, stale-while-revalidate={TEMPLATE_CATALOG_STALE_SECONDS}",
+    }
+    if _etag_matches(request.headers.get("If-None-Match", ""), snapshot["etag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=snapshot["body"], media_type="application/json", headers=headers)
 
 # --- Original Routes ---
 
@@ -493,17 +804,126 @@ async def parse_file(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/generate")
-async def generate(request: GenerateRequest, req: Request):
+async def generate(
+    request: GenerateRequest,
+    req: Request,
+    mode: Optional[str] = None,
+    user_id: str = Depends(admit_generation),
+):
+    reserve_credits(user_id, 1)
     prompt = build_prompt(request.template_type, request.form_data, request.context_text)
+
+    if mode == "job":
+        # Async job mode: generation keeps running server-side; poll or tail /api/jobs/{job_id}
+        job_id = submit_job(prompt, request.template_type, request.form_data, user_id)
+        return {"job_id": job_id, "status": "pending"}
     
     return StreamingResponse(
         stream_generate(prompt),
         media_type="text/event-stream"
     )
 
+def _get_user_job(job_id: str, user_id: str, offset: int = 0) -> Dict[str, Any]:
+    job = get_job_store().get(job_id, offset)
+    if not job or (job["user_id"] and job["user_id"] != user_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, offset: int = 0, user_id: str = Depends(get_current_user)):
+    job = _get_user_job(job_id, user_id, offset)
+    delta = job.pop("delta") or ""
+    return {**job, "offset": offset + len(delta), "content": delta}
+
+@app.get("/api/jobs/{job_id}/stream")
+async def stream_job(job_id: str, offset: int = 0, user_id: str = Depends(get_current_user)):
+    _get_user_job(job_id, user_id)
+    return StreamingResponse(
+        tail_job(job_id, offset),
+        media_type="text/event-stream"
+    )
+
+@app.post("/api/generate/batch")
+async def generate_batch(request: BatchGenerateRequest, user_id: str = Depends(get_current_user)):
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one item")
+    # A batch larger than the rate limit window could never be admitted, so cap it there too
+    max_items = min(BATCH_MAX_ITEMS, GENERATE_RATE_LIMIT)
+    if len(request.items) > max_items:
+        raise HTTPException(status_code=400, detail=f"Batch too large: at most {max_items} items")
+    # Each article counts against the generate rate limit, same as separate requests
+    _admit(user_id, "generate", GENERATE_RATE_LIMIT, len(request.items), cost=len(request.items))
+    reserve_credits(user_id, len(request.items))
+
+    templates = await get_templates_for_batch([item.template_type for item in request.items])
+    prompts = [
+        build_prompt(
+            item.template_type,
+            item.form_data,
+            item.context_text or request.context_text,
+            template_config=templates.get(item.template_type) or {},
+        )
+        for item in request.items
+    ]
+
+    return StreamingResponse(
+        stream_generate_batch(prompts),
+        media_type="text/event-stream"
+    )
+
 @app.post("/api/rewrite")
-async def rewrite(request: RewriteRequest):
+async def rewrite(request: RewriteRequest, user_id: str = Depends(admit_rewrite)):
     return StreamingResponse(
         rewrite_text(request.text, request.command, request.context_before, request.context_after),
         media_type="text/event-stream"
     )
+
+# --- Rewrite Session Routes ---
+
+@app.post("/api/rewrite/sessions")
+async def create_rewrite_session(payload: RewriteSessionCreate, user_id: str = Depends(get_current_user)):
+    try:
+        return rewrite_sessions.create(payload.document, user_id).to_dict()
+    except RewriteSessionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+@app.patch("/api/rewrite/sessions/{session_id}")
+async def update_rewrite_session(
+    session_id: str,
+    payload: RewriteSessionUpdate,
+    user_id: str = Depends(get_current_user),
+):
+    try:
+        session = rewrite_sessions.get(session_id, user_id)
+        with session.lock:
+            check_version(session, payload.version)
+            if payload.document is not None:
+                check_document(payload.document)
+                session.set_document(payload.document)
+            elif payload.ops:
+                ops = [op.dict() for op in payload.ops]
+                check_ops(session, ops)
+                document = apply_ops(session.document, ops)
+                check_document(document)
+                session.set_document(document)
+    except RewriteSessionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return session.to_dict()
+
+@app.delete("/api/rewrite/sessions/{session_id}")
+async def delete_rewrite_session(session_id: str, user_id: str = Depends(get_current_user)):
+    rewrite_sessions.delete(session_id, user_id)
+    return {"success": True}
+
+@app.post("/api/rewrite/sessions/{session_id}/rewrite")
+async def rewrite_in_session(session_id: str, request: SessionRewriteRequest, user_id: str = Depends(admit_rewrite)):
+    try:
+        session = rewrite_sessions.get(session_id, user_id)
+        prepared = prepare_session_rewrite(session, request.start, request.end, request.command, request.version)
+    except RewriteSessionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    return StreamingResponse(
+        stream_session_rewrite(session, request.start, prepared),
+        media_type="text/event-stream"
+    )
@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import tempfile
+import threading
+from typing import Dict, Any, Optional, AsyncGenerator
+
+try:
+    from api.generator import stream_generate, is_upstream_error
+except ImportError:
+    from generator import stream_generate, is_upstream_error
+
+# Job store configuration. SQLite is the local stand-in for a shared store;
+# the default lives in the temp dir because it is the only writable path on serverless.
+JOBS_DB_PATH = os.environ.get("JOBS_DB_PATH") or os.path.join(tempfile.gettempdir(), "xuanchuangao_jobs.sqlite3")
+JOB_FLUSH_INTERVAL_SECONDS = float(os.environ.get("JOB_FLUSH_INTERVAL_SECONDS", "0.5"))
+JOB_TAIL_POLL_SECONDS = float(os.environ.get("JOB_TAIL_POLL_SECONDS", "0.5"))
+# Workers touch updated_at on every flush, and the upstream client gives up after 60 s
+# without data, so an unfinished job silent for longer than this has lost its worker
+# (process restart, killed serverless instance).
+JOB_HEARTBEAT_TIMEOUT_SECONDS = float(os.environ.get("JOB_HEARTBEAT_TIMEOUT_SECONDS", "180"))
+JOB_RETENTION_SECONDS = float(os.environ.get("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+JOB_CLEANUP_INTERVAL_SECONDS = 3600
+
+JOB_STATUS_PENDING = "pending"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_DONE = "done"
+JOB_STATUS_ERROR = "error"
+JOB_FINAL_STATUSES = (JOB_STATUS_DONE, JOB_STATUS_ERROR)
+
+
+class JobStore:
+    """
+    Persist generation jobs and their accumulated output in SQLite.
+    Content is appended in chunks so readers can resume from any character offset.
+    """
+
+    def __init__(self, path: str = JOBS_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._last_cleanup: Optional[float] = None
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("pragma journal_mode=wal")
+            self._conn.execute(
+                """
+                create table if not exists generation_jobs (
+                    id text primary key,
+                    status text not null,
+                    user_id text,
+                    template_type text,
+                    form_data text,
+                    content text not null default '',
+                    error text,
+                    created_at real not null,
+                    updated_at real not null
+                )
+                """
+            )
+            self._conn.execute("create index if not exists generation_jobs_updated_at on generation_jobs (updated_at)")
+
+    def cleanup(self):
+        """
+        Delete jobs not touched within the retention period.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("delete from generation_jobs where updated_at < ?", (time.time() - JOB_RETENTION_SECONDS,))
+        self._last_cleanup = time.monotonic()
+
+    def create(self, template_type: str, form_data: Dict[str, Any], user_id: Optional[str] = None) -> str:
+        if self._last_cleanup is None or time.monotonic() - self._last_cleanup > JOB_CLEANUP_INTERVAL_SECONDS:
+            self.cleanup()
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "insert into generation_jobs (id, status, user_id, template_type, form_data, created_at, updated_at) "
+                "values (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, JOB_STATUS_PENDING, user_id, template_type, json.dumps(form_data, ensure_ascii=False), now, now),
+            )
+        return job_id
+
+    def append(self, job_id: str, content: str, status: Optional[str] = None, error: Optional[str] = None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "update generation_jobs set content = content || ?, status = coalesce(?, status), "
+                "error = coalesce(?, error), updated_at = ? where id = ?",
+                (content, status, error, time.time(), job_id),
+            )
+
+    def _expire_stale(self, job_id: str):
+        # Only flips the row if the worker still has not written since the cutoff
+        with self._lock, self._conn:
+            self._conn.execute(
+                "update generation_jobs set status = ?, error = ? "
+                "where id = ? and status not in (?, ?) and updated_at < ?",
+                (JOB_STATUS_ERROR, "Job worker stopped before finishing", job_id,
+                 *JOB_FINAL_STATUSES, time.time() - JOB_HEARTBEAT_TIMEOUT_SECONDS),
+            )
+
+    def get(self, job_id: str, offset: int = 0) -> Optional[Dict[str, Any]]:
+        self._expire_stale(job_id)
+        # substr is 1-based and counts characters, matching Python string offsets
+        with self._lock:
+            row = self._conn.execute(
+                "select id, status, user_id, template_type, form_data, error, created_at, updated_at, "
+                "length(content) as length, substr(content, ?) as delta from generation_jobs where id = ?",
+                (max(offset, 0) + 1, job_id),
+            ).fetchone()
+        if not row:
+            return None
+        job = dict(row)
+        job["form_data"] = json.loads(job["form_data"] or "{}")
+        return job
+
+
+_store: Optional[JobStore] = None
+_workers = set()
+
+
+def get_job_store() -> JobStore:
+    global _store
+    if _store is None:
+        _store = JobStore()
+    return _store
+
+
+async def _run_job(job_id: str, prompt: str):
+    store = get_job_store()
+    buffer = []
+    last_flush = time.monotonic()
+    error = None
+    try:
+        store.append(job_id, "", status=JOB_STATUS_RUNNING)
+        async for chunk in stream_generate(prompt):
+            if is_upstream_error(chunk):
+                # Keep the error text out of the article content
+                error = chunk.strip()
+                break
+            buffer.append(chunk)
+            # Batch writes so the store is not hit once per token
+            if time.monotonic() - last_flush >= JOB_FLUSH_INTERVAL_SECONDS:
+                store.append(job_id, "".join(buffer))
+                buffer.clear()
+                last_flush = time.monotonic()
+        status = JOB_STATUS_ERROR if error else JOB_STATUS_DONE
+        store.append(job_id, "".join(buffer), status=status, error=error)
+    except Exception as e:
+        store.append(job_id, "".join(buffer), status=JOB_STATUS_ERROR, error=str(e))
+
+
+def submit_job(prompt: str, template_type: str, form_data: Dict[str, Any], user_id: Optional[str] = None) -> str:
+    """
+    Create a job and start consuming the upstream stream in the background.
+    Must be called from within a running event loop.
+    """
+    job_id = get_job_store().create(template_type, form_data, user_id)
+    task = asyncio.create_task(_run_job(job_id, prompt))
+    # Keep a reference so the worker is not garbage collected mid-stream
+    _workers.add(task)
+    task.add_done_callback(_workers.discard)
+    return job_id
+
+
+async def tail_job(job_id: str, offset: int = 0) -> AsyncGenerator[str, None]:
+    """
+    Yield job output from offset onwards, following it until the job finishes.
+    """
+    store = get_job_store()
+    while True:
+        job = store.get(job_id, offset)
+        if not job:
+            return
+        if job["delta"]:
+            offset += len(job["delta"])
+            yield job["delta"]
+        if job["status"] in JOB_FINAL_STATUSES:
+            return
+        await asyncio.sleep(JOB_TAIL_POLL_SECONDS)
@@ -0,0 +1,148 @@
+import io
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+# Optional local OCR stage. Requires the Tesseract binary with the chi_sim
+# language pack plus `pip install pytesseract pillow`; without them image
+# inputs are rejected and scanned PDF pages are skipped.
+try:
+    import pytesseract
+    from PIL import Image
+    OCR_AVAILABLE = True
+except ImportError:
+    pytesseract = None
+    Image = None
+    OCR_AVAILABLE = False
+
+OCR_LANG = os.environ.get("OCR_LANG", "chi_sim+eng")
+OCR_MAX_WORKERS = int(os.environ.get("OCR_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Longest image side in pixels; larger inputs are downscaled before recognition
+OCR_MAX_SIDE = int(os.environ.get("OCR_MAX_SIDE", "2400"))
+OCR_CACHE_DIR = os.environ.get("OCR_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "xuanchuangao_ocr_cache")
+OCR_MEMORY_CACHE_SIZE = int(os.environ.get("OCR_MEMORY_CACHE_SIZE", "256"))
+# The disk cache keeps at most this many results, dropping the least recently written
+OCR_CACHE_MAX_FILES = int(os.environ.get("OCR_CACHE_MAX_FILES", "5000"))
+# Scanned PDF pages recognized per document; later scanned pages are skipped
+OCR_MAX_PAGES = int(os.environ.get("OCR_MAX_PAGES", "50"))
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+
+_memory_cache: "OrderedDict[str, str]" = OrderedDict()
+_cache_lock = threading.Lock()
+_disk_writes = 0
+# Prune the disk cache once per this many writes rather than listing it on every write
+_PRUNE_EVERY = 100
+
+
+def _cache_key(content: bytes) -> str:
+    # Settings that change the output are part of the key
+    h = hashlib.sha256(content)
+    h.update(f"|{OCR_LANG}|{OCR_MAX_SIDE}".encode())
+    return h.hexdigest()
+
+
+def _cache_get(key: str) -> Optional[str]:
+    with _cache_lock:
+        if key in _memory_cache:
+            _memory_cache.move_to_end(key)
+            return _memory_cache[key]
+    path = os.path.join(OCR_CACHE_DIR, f"{key}.txt")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+    except OSError:
+        return None
+    _cache_put(key, text, persist=False)
+    return text
+
+
+def _cache_put(key: str, text: str, persist: bool = True):
+    with _cache_lock:
+        _memory_cache[key] = text
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > OCR_MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+    if not persist:
+        return
+    try:
+        os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+        tmp_path = os.path.join(OCR_CACHE_DIR, f"{key}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, os.path.join(OCR_CACHE_DIR, f"{key}.txt"))
+    except OSError as e:
+        print(f"Failed to write OCR cache: {e}")
+        return
+    global _disk_writes
+    with _cache_lock:
+        _disk_writes += 1
+        prune = _disk_writes % _PRUNE_EVERY == 1
+    if prune:
+        _prune_disk_cache()
+
+
+def _prune_disk_cache(max_files: int = OCR_CACHE_MAX_FILES):
+    """
+    Delete the oldest cached results (by mtime) beyond max_files.
+    """
+    try:
+        entries = [e for e in os.scandir(OCR_CACHE_DIR) if e.name.endswith(".txt")]
+        if len(entries) <= max_files:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - max_files]:
+            os.remove(entry.path)
+    except OSError as e:
+        print(f"Failed to prune OCR cache: {e}")
+
+
+def _prepare_image(content: bytes):
+    image = Image.open(io.BytesIO(content))
+    if image.mode not in ("L", "RGB"):
+        image = image.convert("RGB")
+    if max(image.size) > OCR_MAX_SIDE:
+        image.thumbnail((OCR_MAX_SIDE, OCR_MAX_SIDE))
+    # Grayscale is enough for text and roughly a third of the work for Tesseract
+    return image.convert("L")
+
+
+def ocr_image(content: bytes) -> str:
+    """
+    Recognize text in one encoded image, using the content-hash cache.
+    """
+    if not OCR_AVAILABLE:
+        raise RuntimeError("OCR not available: install Tesseract (chi_sim), pytesseract and pillow")
+    key = _cache_key(content)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+    text = pytesseract.image_to_string(_prepare_image(content), lang=OCR_LANG).strip()
+    _cache_put(key, text)
+    return text
+
+
+def _ocr_image_or_empty(content: bytes) -> str:
+    # One bad page (undecodable image, missing Tesseract binary or language data)
+    # must not discard the rest of the document
+    try:
+        return ocr_image(content)
+    except Exception as e:
+        print(f"OCR failed for image: {e}")
+        return ""
+
+
+def ocr_images(images: List[bytes], max_workers: int = OCR_MAX_WORKERS) -> List[str]:
+    """
+    OCR several images in parallel, returning texts in input order.
+    Images that fail to recognize yield "".
+    Tesseract runs as a subprocess, so a thread pool gives real parallelism.
+    """
+    if len(images) <= 1 or max_workers <= 1:
+        return [_ocr_image_or_empty(content) for content in images]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(images))) as pool:
+        return list(pool.map(_ocr_image_or_empty, images))
@@ -1,10 +1,16 @@
 import io
 import os
+import asyncio
 from fastapi import UploadFile, HTTPException
 import docx
 import pptx
 import PyPDF2
 
+try:
+    from api.ocr import OCR_AVAILABLE, OCR_MAX_PAGES, IMAGE_EXTENSIONS, ocr_image, ocr_images
+except ImportError:
+    from ocr import OCR_AVAILABLE, OCR_MAX_PAGES, IMAGE_EXTENSIONS, ocr_image, ocr_images
+
 async def extract_text_from_file(file: UploadFile) -> str:
     """
     Extract text from uploaded file based on its content type or extension.
@@ -13,7 +19,8 @@ async def extract_text_from_file(file: UploadFile) -> str:
     content = await file.read()
     file_stream = io.BytesIO(content)
     
-    return _parse_content(file_stream, filename)
+    # Parsing (and OCR in particular) is blocking; keep it off the event loop
+    return await asyncio.to_thread(_parse_content, file_stream, filename)
 
 def read_text_from_path(file_path: str) -> str:
     """
@@ -44,6 +51,8 @@ def _parse_content(file_stream, filename: str) -> str:
             return parse_pptx(file_stream)
         elif filename.endswith(".pdf"):
             return parse_pdf(file_stream)
+        elif filename.endswith(IMAGE_EXTENSIONS):
+            return parse_image(file_stream)
         elif filename.endswith(".txt"):
             return file_stream.getvalue().decode("utf-8")
         else:
@@ -76,11 +85,39 @@ def parse_pptx(file_stream) -> str:
                 full_text.append(shape.text)
     return "\n".join(full_text)
 
+def parse_image(file_stream) -> str:
+    if not OCR_AVAILABLE:
+        raise HTTPException(status_code=400, detail="Image parsing requires OCR (Tesseract chi_sim, pytesseract, pillow)")
+    return ocr_image(file_stream.getvalue())
+
 def parse_pdf(file_stream) -> str:
     reader = PyPDF2.PdfReader(file_stream)
-    full_text = []
-    for page in reader.pages:
+    page_texts = []
+    scanned = []  # (page index, embedded image bytes) for pages without a text layer
+    scanned_pages = 0
+    skipped_pages = 0
+    for index, page in enumerate(reader.pages):
         text = page.extract_text()
         if text and text.strip():
-            full_text.append(text)
-    return "\n".join(full_text)
+            page_texts.append(text)
+            continue
+        page_texts.append("")
+        if OCR_AVAILABLE:
+            if scanned_pages >= OCR_MAX_PAGES:
+                skipped_pages += 1
+                continue
+            scanned_pages += 1
+            try:
+                scanned.extend((index, image.data) for image in page.images)
+            except Exception as e:
+                print(f"Error extracting images from PDF page {index}: {e}")
+
+    if scanned:
+        ocr_texts = ocr_images([data for _, data in scanned])
+        for (index, _), text in zip(scanned, ocr_texts):
+            if text:
+                page_texts[index] = f"{page_texts[index]}\n{text}" if page_texts[index] else text
+
+    if skipped_pages:
+        page_texts.append(f"[OCR 页数已达上限 {OCR_MAX_PAGES} 页，其余 {skipped_pages} 个扫描页未识别]")
+    return "\n".join(text for text in page_texts if text.strip())
@@ -0,0 +1,84 @@
+import os
+import time
+import uuid
+import threading
+from collections import deque
+from typing import Dict, Tuple, Optional
+
+# Optional Redis-compatible backend (Redis, Valkey, a local redis-server...)
+try:
+    import redis
+except ImportError:
+    redis = None
+
+RATE_LIMIT_REDIS_URL = os.environ.get("RATE_LIMIT_REDIS_URL")
+
+
+class MemoryRateLimitStore:
+    """
+    Sliding-window log per key, kept in process memory.
+    """
+
+    def __init__(self):
+        self._hits: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: int, window: float, cost: int = 1) -> Tuple[bool, float]:
+        """
+        Record cost hits if they fit under limit within the last window seconds.
+        Returns (allowed, retry_after_seconds).
+        """
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.setdefault(key, deque())
+            while hits and hits[0] <= now - window:
+                hits.popleft()
+            if cost > limit:
+                return False, window
+            if len(hits) + cost > limit:
+                # Wait until enough of the oldest hits have left the window
+                return False, hits[len(hits) + cost - limit - 1] + window - now
+            hits.extend([now] * cost)
+            # Drop idle keys so the store does not grow with every caller ever seen
+            if len(self._hits) > 10000:
+                for stale in [k for k, v in self._hits.items() if not v or v[-1] <= now - window]:
+                    del self._hits[stale]
+            return True, 0.0
+
+
+class RedisRateLimitStore:
+    """
+    The same sliding window on a Redis sorted set, shared across instances.
+    """
+
+    def __init__(self, url: str):
+        self._client = redis.Redis.from_url(url)
+
+    def hit(self, key: str, limit: int, window: float, cost: int = 1) -> Tuple[bool, float]:
+        if cost > limit:
+            return False, window
+        now = time.time()
+        redis_key = f"ratelimit:{key}"
+        members = {uuid.uuid4().hex: now for _ in range(cost)}
+        # Add first, then count: concurrent callers cannot both slip under the limit
+        pipe = self._client.pipeline()
+        pipe.zremrangebyscore(redis_key, 0, now - window)
+        pipe.zadd(redis_key, members)
+        pipe.zcard(redis_key)
+        pipe.zrange(redis_key, 0, 0, withscores=True)
+        pipe.expire(redis_key, int(window) + 1)
+        _, _, count, oldest, _ = pipe.execute()
+        if count > limit:
+            self._client.zrem(redis_key, *members)
+            retry_after = oldest[0][1] + window - now if oldest else window
+            return False, max(retry_after, 0.0)
+        return True, 0.0
+
+
+def create_rate_limit_store(url: Optional[str] = RATE_LIMIT_REDIS_URL):
+    if url:
+        if redis is None:
+            print("RATE_LIMIT_REDIS_URL is set but redis is not installed; using in-memory rate limits")
+        else:
+            return RedisRateLimitStore(url)
+    return MemoryRateLimitStore()
@@ -0,0 +1,294 @@
+import os
+import re
+import json
+import time
+import asyncio
+import uuid
+import difflib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, AsyncGenerator, Tuple
+
+try:
+    from api.generator import stream_chat, is_upstream_error, SYSTEM_PROMPT
+except ImportError:
+    from generator import stream_chat, is_upstream_error, SYSTEM_PROMPT
+
+# Rewrite session configuration
+REWRITE_SESSION_TTL_SECONDS = int(os.environ.get("REWRITE_SESSION_TTL_SECONDS", "3600"))
+REWRITE_SESSION_MAX = int(os.environ.get("REWRITE_SESSION_MAX", "500"))
+REWRITE_SESSIONS_PER_USER = int(os.environ.get("REWRITE_SESSIONS_PER_USER", "5"))
+REWRITE_SESSION_MAX_CHARS = int(os.environ.get("REWRITE_SESSION_MAX_CHARS", "50000"))
+# Documents are sent to the model in chunk-aligned pages of about this size.
+# Page boundaries only move when the text before them changes, so repeated
+# commands on the same page send a byte-identical prefix that the provider can serve
+# from its prompt cache.
+REWRITE_PAGE_CHARS = int(os.environ.get("REWRITE_PAGE_CHARS", "6000"))
+REWRITE_MAX_SELECTION_CHARS = int(os.environ.get("REWRITE_MAX_SELECTION_CHARS", "8000"))
+# Changed sentence spans longer than this are replaced whole instead of diffed per character
+REWRITE_CHAR_DIFF_MAX = int(os.environ.get("REWRITE_CHAR_DIFF_MAX", "2000"))
+
+_SENTENCE_RE = re.compile(r"[^。！？；!?;\n]*[。！？；!?;\n]|[^。！？；!?;\n]+")
+
+
+class RewriteSessionError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def split_chunks(document: str) -> List[Tuple[int, int]]:
+    """
+    Split a document into paragraph chunks as [start, end) offsets, newline included.
+    """
+    chunks = []
+    start = 0
+    while start < len(document):
+        end = document.find("\n", start)
+        end = len(document) if end == -1 else end + 1
+        chunks.append((start, end))
+        start = end
+    return chunks
+
+
+def split_pages(chunks: List[Tuple[int, int]], page_chars: int = REWRITE_PAGE_CHARS) -> List[Tuple[int, int]]:
+    pages = []
+    for start, end in chunks:
+        if pages and end - pages[-1][0] <= page_chars:
+            pages[-1] = (pages[-1][0], end)
+        else:
+            pages.append((start, end))
+    return pages
+
+
+def _split_sentences(text: str) -> List[str]:
+    return _SENTENCE_RE.findall(text)
+
+
+def diff_ops(old: str, new: str, base: int = 0) -> List[Dict[str, Any]]:
+    """
+    Minimal replace operations turning old into new. Offsets refer to the
+    original text (shifted by base); apply them from last to first.
+
+    Diffs by sentence first, then per character only inside changed spans of
+    bounded size, so the cost stays near-linear for long selections.
+    """
+    old_sentences, new_sentences = _split_sentences(old), _split_sentences(new)
+    old_offsets, new_offsets = [0], [0]
+    for sentence in old_sentences:
+        old_offsets.append(old_offsets[-1] + len(sentence))
+    for sentence in new_sentences:
+        new_offsets.append(new_offsets[-1] + len(sentence))
+
+    ops = []
+    matcher = difflib.SequenceMatcher(None, old_sentences, new_sentences, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        o1, o2 = old_offsets[i1], old_offsets[i2]
+        n1, n2 = new_offsets[j1], new_offsets[j2]
+        if tag == "replace" and max(o2 - o1, n2 - n1) <= REWRITE_CHAR_DIFF_MAX:
+            char_matcher = difflib.SequenceMatcher(None, old[o1:o2], new[n1:n2], autojunk=False)
+            ops.extend(
+                {"start": base + o1 + c1, "end": base + o1 + c2, "text": new[n1 + d1:n1 + d2]}
+                for ctag, c1, c2, d1, d2 in char_matcher.get_opcodes()
+                if ctag != "equal"
+            )
+        else:
+            ops.append({"start": base + o1, "end": base + o2, "text": new[n1:n2]})
+    return ops
+
+
+def apply_ops(document: str, ops: List[Dict[str, Any]]) -> str:
+    for op in sorted(ops, key=lambda o: o["start"], reverse=True):
+        document = document[:op["start"]] + op["text"] + document[op["end"]:]
+    return document
+
+
+class RewriteSession:
+    def __init__(self, document: str, user_id: str):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.version = 0
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+        self.set_document(document)
+
+    def set_document(self, document: str):
+        self.document = document
+        self.chunks = split_chunks(document)
+        self.pages = split_pages(self.chunks)
+        self.version += 1
+
+    def window(self, start: int, end: int) -> Tuple[int, int]:
+        # Pages overlapping the selection; always non-empty for a non-empty document
+        overlapping = [p for p in self.pages if p[0] < max(end, start + 1) and p[1] > start]
+        if not overlapping:
+            return (0, len(self.document))
+        return (overlapping[0][0], overlapping[-1][1])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.id,
+            "version": self.version,
+            "length": len(self.document),
+            "chunks": self.chunks,
+        }
+
+
+class RewriteSessionStore:
+    """
+    In-memory LRU of rewrite sessions with idle expiry.
+    """
+
+    def __init__(self, max_sessions: int = REWRITE_SESSION_MAX, ttl: int = REWRITE_SESSION_TTL_SECONDS):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, RewriteSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, document: str, user_id: str) -> RewriteSession:
+        check_document(document)
+        session = RewriteSession(document, user_id)
+        with self._lock:
+            # A user replaces their own oldest sessions before touching anyone else's
+            owned = [sid for sid, s in self._sessions.items() if s.user_id == user_id]
+            for sid in owned[:max(0, len(owned) - REWRITE_SESSIONS_PER_USER + 1)]:
+                del self._sessions[sid]
+            self._sessions[session.id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id: str, user_id: str) -> RewriteSession:
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session and now - session.last_used > self.ttl:
+                del self._sessions[session_id]
+                session = None
+            if not session or session.user_id != user_id:
+                raise RewriteSessionError(404, "Rewrite session not found or expired")
+            session.last_used = now
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def delete(self, session_id: str, user_id: str):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session and session.user_id == user_id:
+                del self._sessions[session_id]
+
+
+rewrite_sessions = RewriteSessionStore()
+
+
+def build_rewrite_messages(session: RewriteSession, start: int, end: int, command: str) -> List[Dict[str, str]]:
+    # Stable content first (system prompt, then the page text), per-command content last,
+    # so consecutive commands share the longest possible prompt prefix.
+    page_start, page_end = session.window(start, end)
+    page = session.document[page_start:page_end]
+    selection = session.document[start:end]
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"以下是正在编辑的文章片段，作为改写时的上下文参考：\n\n{page}"},
+        {
+            "role": "user",
+            "content": (
+                f"请对其中以下这段文字进行【{command}】：\n\n\"{selection}\"\n\n"
+                "要求：只返回修改后的文本，不要包含解释性语言。"
+            ),
+        },
+    ]
+
+
+def _event(event: str, **fields) -> str:
+    return f"data: {json.dumps({'event': event, **fields}, ensure_ascii=False)}\n\n"
+
+
+def check_document(document: str):
+    if len(document) > REWRITE_SESSION_MAX_CHARS:
+        raise RewriteSessionError(413, f"Document too long: at most {REWRITE_SESSION_MAX_CHARS} characters")
+
+
+def check_version(session: RewriteSession, version: Optional[int]):
+    if version is not None and version != session.version:
+        raise RewriteSessionError(409, f"Session is at version {session.version}, not {version}")
+
+
+def check_ops(session: RewriteSession, ops: List[Dict[str, Any]]):
+    spans = sorted((op["start"], op["end"]) for op in ops)
+    for i, (start, end) in enumerate(spans):
+        if not (0 <= start <= end <= len(session.document)):
+            raise RewriteSessionError(400, "Edit range out of bounds")
+        if i and start < spans[i - 1][1]:
+            raise RewriteSessionError(400, "Edit ranges overlap")
+
+
+def check_selection(session: RewriteSession, start: int, end: int):
+    if not (0 <= start < end <= len(session.document)):
+        raise RewriteSessionError(400, "Invalid selection range")
+    if end - start > REWRITE_MAX_SELECTION_CHARS:
+        raise RewriteSessionError(400, f"Selection too long: at most {REWRITE_MAX_SELECTION_CHARS} characters")
+
+
+def prepare_session_rewrite(
+    session: RewriteSession, start: int, end: int, command: str, version: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Validate a rewrite request and snapshot everything it depends on, so edits
+    landing before the stream starts are detected when the diff is applied.
+    """
+    with session.lock:
+        check_version(session, version)
+        check_selection(session, start, end)
+        return {
+            "base_version": session.version,
+            "original": session.document[start:end],
+            "messages": build_rewrite_messages(session, start, end, command),
+        }
+
+
+async def stream_session_rewrite(session: RewriteSession, start: int, prepared: Dict[str, Any]) -> AsyncGenerator[str, None]:
+    """
+    Rewrite the selection snapshotted by prepare_session_rewrite and finish with a
+    minimal diff against the session document. The diff is applied to the
+    session, bumping its version.
+    """
+    base_version = prepared["base_version"]
+    original = prepared["original"]
+    messages = prepared["messages"]
+
+    parts = []
+    async for chunk in stream_chat(messages):
+        if is_upstream_error(chunk):
+            yield _event("error", message=chunk.strip())
+            return
+        parts.append(chunk)
+        yield _event("chunk", content=chunk)
+
+    rewritten = "".join(parts).strip()
+    if not rewritten:
+        yield _event("error", message="Empty rewrite result")
+        return
+    # The model drops surrounding whitespace; keep the selection's own (e.g. a
+    # paragraph's trailing newline) so the diff does not merge paragraphs.
+    if original.strip():
+        leading = original[:len(original) - len(original.lstrip())]
+        trailing = original[len(original.rstrip()):]
+        rewritten = f"{leading}{rewritten}{trailing}"
+
+    # Diffing is CPU-bound; keep it off the event loop
+    ops = await asyncio.to_thread(diff_ops, original, rewritten, start)
+    # Decide under the lock, but never yield while holding it: the generator can
+    # stay suspended indefinitely and the lock is taken on the event loop thread.
+    with session.lock:
+        conflict = session.version != base_version
+        if not conflict:
+            session.set_document(apply_ops(session.document, ops))
+            new_version = session.version
+    if conflict:
+        yield _event("error", message="Session changed during rewrite")
+        return
+    yield _event("diff", base_version=base_version, version=new_version, ops=ops)
@@ -9,6 +9,7 @@ import { Loader2, Wand2, Download } from "lucide-react";
 import { saveAs } from "file-saver";
 
 import { toast } from "sonner";
+import { supabase } from "@/lib/supabase";
 
 interface RichEditorProps {
   content: string;
@@ -109,10 +110,16 @@ export function RichEditor({ content, isStreaming }: RichEditorProps) {
       const contextBefore = editor.state.doc.textBetween(Math.max(0, from - 500), from);
       const contextAfter = editor.state.doc.textBetween(to, Math.min(docSize, to + 500));
 
+      const { data: { session } } = await supabase.auth.getSession();
+      const token = session?.access_token;
+
       editor.setEditable(false);
       const res = await fetch("/api/rewrite", {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: {
+          "Content-Type": "application/json",
+          ...(token ? { "Authorization": `Bearer ${token}` } : {})
+        },
         body: JSON.stringify({
           text,
           command,
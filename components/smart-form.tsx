@@ -41,7 +41,7 @@ export function SmartForm({ templateType, onGenerate, isGenerating }: SmartFormP
     const fetchConfig = async () => {
       setIsLoadingConfig(true);
       try {
-        const res = await fetch(`/api/templates?t=${Date.now()}`, { cache: "no-store" });
+        const res = await fetch("/api/templates", { cache: "no-cache" });
         if (res.ok) {
           const templates = await res.json();
           const currentTemplate = templates.find((t: any) => t.key === templateType);
@@ -30,7 +30,7 @@ export function TemplateCards() {
   useEffect(() => {
     const fetchTemplates = async () => {
       try {
-        const res = await fetch(`/api/templates?t=${Date.now()}`, { cache: "no-store" });
+        const res = await fetch("/api/templates", { cache: "no-cache" });
         if (!res.ok) {
           setTemplates([]);
           return;
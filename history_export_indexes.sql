@@ -0,0 +1,11 @@
+-- 生成记录导出索引脚本
+-- 请在 Supabase Dashboard 的 SQL Editor 中执行此脚本
+
+-- 后台导出 (/api/admin/history/export) 按 (created_at, id) 做键集分页，
+-- 每一页都是一次索引范围扫描，而不是对全表过滤后排序
+CREATE INDEX IF NOT EXISTS idx_generation_history_created_at_id
+  ON public.generation_history (created_at, id);
+
+-- 按用户导出时使用
+CREATE INDEX IF NOT EXISTS idx_generation_history_user_created_at_id
+  ON public.generation_history (user_id, created_at, id);
@@ -5,6 +5,8 @@ import json
 # Configuration
 API_URL = "http://127.0.0.1:8000"
 EXAMPLES_DIR = "examples"
+# Supabase access token of a test user with credits; generation endpoints reject anonymous calls
+USER_TOKEN = os.environ.get("TEST_USER_TOKEN", "")
 
 def test_health():
     print("Testing /api/health...")
@@ -15,6 +17,19 @@ def test_health():
     except Exception as e:
         print(f"Health check failed: {e}")
 
+def test_templates_etag():
+    print("\nTesting /api/templates conditional GET...")
+    try:
+        response = requests.get(f"{API_URL}/api/templates")
+        assert response.status_code == 200
+        etag = response.headers.get("ETag")
+        print(f"Catalog returned {len(response.json())} templates, ETag {etag}")
+        cached = requests.get(f"{API_URL}/api/templates", headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        print("Conditional GET returned 304.")
+    except Exception as e:
+        print(f"Template catalog check failed: {e}")
+
 def test_parse_and_generate():
     print("\nTesting Parsing and Generation Flow...")
     
@@ -66,7 +81,8 @@ def test_parse_and_generate():
     }
 
     try:
-        with requests.post(f"{API_URL}/api/generate", json=payload, stream=True) as response:
+        headers = {"Authorization": f"Bearer {USER_TOKEN}"} if USER_TOKEN else {}
+        with requests.post(f"{API_URL}/api/generate", json=payload, headers=headers, stream=True) as response:
             if response.status_code == 200:
                 print("Generation stream started...")
                 chunk_count = 0
@@ -85,4 +101,5 @@ def test_parse_and_generate():
 
 if __name__ == "__main__":
     test_health()
+    test_templates_etag()
     test_parse_and_generate()
@@ -0,0 +1,116 @@
+import os
+import sys
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from api import rewrite_session as rs
+
+
+def collect(session, start, prepared):
+    async def run():
+        return [event async for event in rs.stream_session_rewrite(session, start, prepared)]
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    outputs = {}
+
+    async def fake_stream_chat(messages):
+        yield outputs["text"]
+
+    monkeypatch.setattr(rs, "stream_chat", fake_stream_chat)
+    return outputs
+
+
+@pytest.mark.parametrize("old,new", [
+    ("", "新增内容。"),
+    ("删除全部。", ""),
+    ("公司开了会议。", "公司召开了重要会议。"),
+    ("第一句。第二句。第三句。", "第一句。改过的第二句！第三句。"),
+    ("abc\ndef\nghi", "abc\nxyz\nghi\njkl"),
+])
+def test_diff_ops_round_trip(old, new):
+    doc = "前文。" + old + "后文。"
+    ops = rs.diff_ops(old, new, base=3)
+    assert rs.apply_ops(doc, ops) == "前文。" + new + "后文。"
+
+
+def test_diff_ops_long_span_is_replaced_whole(monkeypatch):
+    monkeypatch.setattr(rs, "REWRITE_CHAR_DIFF_MAX", 5)
+    ops = rs.diff_ops("甲乙丙丁戊己庚辛", "甲乙丙丁戊己庚壬")
+    assert ops == [{"start": 0, "end": 8, "text": "甲乙丙丁戊己庚壬"}]
+
+
+def test_check_ops_rejects_out_of_bounds_and_overlap():
+    session = rs.RewriteSession("0123456789", "u1")
+    rs.check_ops(session, [{"start": 0, "end": 2, "text": ""}, {"start": 2, "end": 4, "text": ""}])
+    with pytest.raises(rs.RewriteSessionError) as e:
+        rs.check_ops(session, [{"start": 8, "end": 11, "text": ""}])
+    assert e.value.status_code == 400
+    with pytest.raises(rs.RewriteSessionError):
+        rs.check_ops(session, [{"start": 0, "end": 5, "text": ""}, {"start": 4, "end": 6, "text": ""}])
+
+
+def test_split_pages_and_window():
+    doc = "aaaa\nbbbb\ncccc\ndddd\n"
+    chunks = rs.split_chunks(doc)
+    assert chunks == [(0, 5), (5, 10), (10, 15), (15, 20)]
+    assert rs.split_pages(chunks, page_chars=10) == [(0, 10), (10, 20)]
+
+    session = rs.RewriteSession(doc, "u1")
+    session.pages = rs.split_pages(session.chunks, page_chars=10)
+    assert session.window(6, 8) == (0, 10)
+    assert session.window(8, 12) == (0, 20)
+
+
+def test_rewrite_keeps_selection_whitespace(fake_model):
+    session = rs.RewriteSession("第一段。\n第二段内容。\n第三段。", "u1")
+    start, end = session.document.index("第二"), session.document.index("第三")
+    fake_model["text"] = "新的第二段"
+    events = collect(session, start, rs.prepare_session_rewrite(session, start, end, "改写"))
+    assert '"event": "diff"' in events[-1]
+    assert session.document == "第一段。\n新的第二段\n第三段。"
+
+
+def test_rewrite_conflict_reports_error_and_releases_lock(fake_model):
+    session = rs.RewriteSession("abc\ndef", "u1")
+    fake_model["text"] = "X"
+    prepared = rs.prepare_session_rewrite(session, 0, 3, "改写")
+    session.set_document("zzabc\ndef")
+
+    events = collect(session, 0, prepared)
+    assert '"event": "error"' in events[-1]
+    assert session.document == "zzabc\ndef"
+
+    # Suspend a stream right after the conflict event: the lock must already be free
+    prepared = rs.prepare_session_rewrite(session, 0, 2, "c")
+    session.set_document("changed")
+
+    async def suspended():
+        stream = rs.stream_session_rewrite(session, 0, prepared)
+        async for event in stream:
+            if '"event": "error"' in event:
+                acquired = session.lock.acquire(timeout=1)
+                if acquired:
+                    session.lock.release()
+                await stream.aclose()
+                return acquired
+
+    assert asyncio.run(suspended())
+
+
+def test_prepare_rejects_stale_version_and_long_selection(monkeypatch):
+    session = rs.RewriteSession("0123456789", "u1")
+    with pytest.raises(rs.RewriteSessionError) as e:
+        rs.prepare_session_rewrite(session, 0, 3, "c", version=session.version + 1)
+    assert e.value.status_code == 409
+
+    monkeypatch.setattr(rs, "REWRITE_MAX_SELECTION_CHARS", 4)
+    with pytest.raises(rs.RewriteSessionError) as e:
+        rs.prepare_session_rewrite(session, 0, 5, "c")
+    assert e.value.status_code == 400